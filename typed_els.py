@@ -1,23 +1,23 @@
 #!/usr/bin/env python3
 
 import collections
-import itertools
+import functools
+import io
 import json
 import logging
+import math
 import re
+import string
 import sys
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 
 import click
 
-TypedProperty = collections.namedtuple(
-    'TypedProperty',
-    [
-        'interface',
-        'property',
-        'type',
-        'comment',
-    ],
-)
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
 _GEO_POINT_TYPE = '{lat: number, lon: number}'
 _GEO_SHAPE_TYPE = ' | '.join('''
 {coordinates: number[], type: 'Point'}
@@ -66,7 +66,7 @@ _TYPE_MAPPINGS = {
 }
 
 # https://github.com/Microsoft/TypeScript/issues/2536#issuecomment-87194347
-_RESERVED_KEYWORDS = {
+_RESERVED_KEYWORDS = frozenset({
     # Reserved Words
     'break',
     'case',
@@ -136,24 +136,29 @@ _RESERVED_KEYWORDS = {
     # Misc.
     # Interface name cannot be 'object'
     'object',
-}
+})
 
 _INTERFACE_NAME = re.compile(r'(\w|\$)(\w|\d|\$)*', flags=re.ASCII)
-_INTERFACE_NAME_1 = re.compile(r'\w|\$', flags=re.ASCII)
 _INTERFACE_NAME_INVALID = re.compile(r'[^\w\$]', flags=re.ASCII)
-
-def normalize_interface_name(name):
+# str.translate() table equivalent to _INTERFACE_NAME_INVALID for ASCII names
+_INTERFACE_NAME_CHARS = frozenset(string.ascii_letters + string.digits + '_$')
+_INTERFACE_NAME_TRANSLATION = str.maketrans({
+    chr(c): '_'
+    for c in range(128)
+    if chr(c) not in _INTERFACE_NAME_CHARS
+})
+
+def normalize_interface_name(name: str) -> str:
     if not name:
         return '_'
 
-    if not re.match(_INTERFACE_NAME_1, name):
-        name = name.replace(name[0], '_', 1)
-
-    name = re.sub(
-        _INTERFACE_NAME_INVALID,
-        '_',
-        name,
-    )
+    # no separate pass for the leading character: it is checked against
+    # the same character set as the rest, so replacing invalid characters
+    # throughout covers it too
+    if name.isascii():
+        name = name.translate(_INTERFACE_NAME_TRANSLATION)
+    else:
+        name = _INTERFACE_NAME_INVALID.sub('_', name)
 
     if name in _RESERVED_KEYWORDS:
         name = name + '_'
@@ -172,16 +177,32 @@ def test_normalize_interface_name():
     assert normalize_interface_name('**') == '__'
     assert normalize_interface_name('-') == '_'
     assert normalize_interface_name('default') == 'default_'
-
-def new_interface_name(interface, used_interface_names):
-    idx = 1
+    assert normalize_interface_name('a.b-c d') == 'a_b_c_d'
+    assert normalize_interface_name('caf\u00e9$1') == 'caf_$1'
+    assert normalize_interface_name('\u00e9') == '_'
+
+    for name in ['', 'hello', '*', ' hello', 'a.b-c d', 'caf\u00e9$1', 'default']:
+        assert _INTERFACE_NAME.fullmatch(normalize_interface_name(name))
+
+def new_interface_name(
+    interface: str,
+    used_interface_names: Set[str],
+    next_idx: Optional[Dict[str, int]] = None,
+) -> str:
+    if next_idx is None:
+        next_idx = {}
+
+    # resume from the last index allocated for this interface instead of
+    # probing interface_1, interface_2, ... from scratch every time
+    idx = next_idx.get(interface, 0)
     new_interface = interface
-    while new_interface in used_interface_names:
-        new_interface = '{interface}_{idx}'.format(
-            interface=interface,
-            idx=idx,
-        )
+    while True:
+        if idx:
+            new_interface = f'{interface}_{idx}'
+        if new_interface not in used_interface_names:
+            break
         idx += 1
+    next_idx[interface] = idx + 1
     used_interface_names.add(new_interface)
     return new_interface
 
@@ -189,94 +210,258 @@ def test_new_interface_name():
     assert new_interface_name('hello', set()) == 'hello'
     assert new_interface_name('hello', {'hello', 'hello_1', 'hello_2'}) == 'hello_3'
 
-def generate_typed_properties(interface, properties, used_interface_names):
-    assert re.fullmatch(_INTERFACE_NAME, interface)
+    used_interface_names = set()
+    next_idx = {}
+    assert new_interface_name('hello', used_interface_names, next_idx) == 'hello'
+    assert new_interface_name('hello', used_interface_names, next_idx) == 'hello_1'
+    used_interface_names.add('hello_2')
+    assert new_interface_name('hello', used_interface_names, next_idx) == 'hello_3'
+    assert next_idx['hello'] == 4
+
+# compact separators: less output and less formatting work per definition
+_dumps = functools.partial(json.dumps, separators=(',', ':'))
+
+# Typed properties are plain (interface, property, type, comment) tuples,
+# which are cheaper to build than namedtuple instances
+TypedProperty = Tuple[str, str, str, Optional[str]]
+
+def generate_typed_properties(
+    interface: str,
+    properties: Dict[str, Any],
+    typed_properties: List[TypedProperty],
+    used_interface_names: Set[str],
+    next_idx: Dict[str, int],
+) -> None:
+    get_type = _TYPE_MAPPINGS.get
 
     for property, definition in properties.items():
         if not property:
             continue
 
         if 'properties' in definition:
-            inner_interface = '{interface}${property}'.format(
-                interface=interface,
-                property=property,
-            );
+            inner_interface = f'{interface}${property}'
             inner_interface = new_interface_name(
                 normalize_interface_name(inner_interface),
                 used_interface_names,
+                next_idx,
             )
-            yield from generate_typed_properties(
+            generate_typed_properties(
                 inner_interface,
                 definition['properties'],
+                typed_properties,
                 used_interface_names,
+                next_idx,
             )
             # object datatype or nested datatype can be an array or a
             # single object
-            yield TypedProperty(
+            typed_properties.append((
                 interface,
                 property,
-                '{interface} | {interface}[]'.format(interface=inner_interface),
-                json.dumps(definition),
-            )
+                f'{inner_interface} | {inner_interface}[]',
+                _dumps(definition),
+            ))
 
         else:
             datatype = definition.get('type')
-            type = _TYPE_MAPPINGS.get(datatype)
+            type = get_type(datatype)
             if type:
-                yield TypedProperty(
+                typed_properties.append((
                     interface,
                     property,
                     type,
-                    json.dumps(definition),
-                )
+                    _dumps(definition),
+                ))
             elif datatype:
-                logging.warning('Unable to find the corresponding TS type for ELS datatype {0}'.format(datatype))
-                yield TypedProperty(
+                logging.warning(f'Unable to find the corresponding TS type for ELS datatype {datatype}')
+                typed_properties.append((
                     interface,
                     property,
                     'any',
-                    json.dumps(definition),
-                )
-
-def search_typed_properties(type, mapping, used_interface_names=None):
+                    _dumps(definition),
+                ))
+
+def search_typed_properties(
+    type: str,
+    mapping: Any,
+    used_interface_names: Optional[Set[str]] = None,
+    next_idx: Optional[Dict[str, int]] = None,
+) -> List[TypedProperty]:
     if used_interface_names is None:
         used_interface_names = set()
+    if next_idx is None:
+        next_idx = {}
+
+    typed_properties: List[TypedProperty] = []
+
+    # walk the mapping with an explicit stack so that deeply nested
+    # mappings don't hit the recursion limit
+    stack = [(type, mapping)]
+    while stack:
+        type, mapping = stack.pop()
+        if not isinstance(mapping, dict):
+            continue
 
-    if isinstance(mapping, dict):
         if 'properties' in mapping:
             interface = new_interface_name(
                 normalize_interface_name(type),
                 used_interface_names,
+                next_idx,
+            )
+            generate_typed_properties(
+                interface,
+                mapping['properties'],
+                typed_properties,
+                used_interface_names,
+                next_idx,
             )
-            yield from generate_typed_properties(interface, mapping['properties'], used_interface_names)
         else:
-            for key, value in mapping.items():
-                yield from search_typed_properties(key, value, used_interface_names)
-
-def print_typed_properties(typed_properties, indent, optional):
-    sorted_typed_properties = sorted(
-        typed_properties,
-        key=lambda tp: tp.interface)
-
-    for interface, group in itertools.groupby(sorted_typed_properties, lambda tp: tp.interface):
-        group = list(group)
-
-        print('export interface {interface} {{'.format(interface=interface))
-        for typed_property in group:
-            if typed_property.comment:
-                print('{indent}/**'.format(indent=indent))
-                print('{indent} * {comment}'.format(indent=indent, comment=typed_property.comment))
-                print('{indent} **/'.format(indent=indent))
-
-            print('{indent}{property}{optional}: {type};'.format(
-                indent=indent,
-                property=json.dumps(typed_property.property),
-                optional='?' if optional else '',
-                type=typed_property.type,
-            ))
-            print()
-        print('}')
-        print()
+            # reversed so that items are visited in their original order
+            stack.extend(reversed(mapping.items()))
+
+    return typed_properties
+
+def test_search_typed_properties():
+    mapping = {
+        'a': {'mappings': {'doc': {'properties': {'id': {'type': 'keyword'}}}}},
+        'b': {'mappings': {'doc': {'properties': {'id': {'type': 'long'}}}}},
+    }
+    assert [
+        (interface, property, type)
+        for interface, property, type, comment in search_typed_properties('Root', mapping)
+    ] == [
+        ('doc', 'id', 'string'),
+        ('doc_1', 'id', 'number'),
+    ]
+
+    assert search_typed_properties(
+        'R',
+        {'properties': {'x': {'type': 'long'}}},
+        set(),
+        {},
+    ) == [('R', 'x', 'number', '{"type":"long"}')]
+
+    # all interfaces are exported side by side, so names derived in
+    # unrelated subtrees must not collide either
+    mapping = {'properties': {
+        'a b': {'properties': {'x': {'type': 'long'}}},
+        'a-b': {'properties': {'x': {'type': 'long'}}},
+        'a$b': {'properties': {'c': {'properties': {'x': {'type': 'long'}}}}},
+        'a': {'properties': {'b$c': {'properties': {'x': {'type': 'long'}}}}},
+    }}
+    assert sorted({
+        interface
+        for interface, property, type, comment in search_typed_properties('Root', mapping)
+    }) == [
+        'Root',
+        'Root$a',
+        'Root$a$b',
+        'Root$a$b$c',
+        'Root$a$b$c_1',
+        'Root$a_b',
+        'Root$a_b_1',
+    ]
+
+def print_typed_properties(typed_properties: Iterable[TypedProperty], indent: str, optional: bool) -> None:
+    # group in a single pass and sort only the (far fewer) interface names
+    groups = collections.defaultdict(list)
+    for typed_property in typed_properties:
+        groups[typed_property[0]].append(typed_property)
+
+    # indent and optional are fixed for the whole run, so build the
+    # constant parts of each line once
+    comment_open = f'{indent}/**'
+    comment_prefix = f'{indent} * '
+    comment_close = f'{indent} **/'
+    property_suffix = '?: ' if optional else ': '
+    dumps = json.dumps
+    property_cache: Dict[str, str] = {}
+
+    # collect all lines and write them out at once rather than
+    # print() each line separately
+    lines = []
+    for interface in sorted(groups):
+        group = groups[interface]
+
+        lines.append(f'export interface {interface} {{')
+        for _, property, type, comment in group:
+            if comment:
+                lines.append(comment_open)
+                lines.append(comment_prefix + comment)
+                lines.append(comment_close)
+
+            property_json = property_cache.get(property)
+            if property_json is None:
+                # ASCII identifiers need no JSON escaping
+                if property.isascii() and property.isidentifier():
+                    property_json = f'"{property}"'
+                else:
+                    property_json = dumps(property)
+                property_cache[property] = property_json
+            lines.append(f'{indent}{property_json}{property_suffix}{type};')
+            lines.append('')
+        lines.append('}')
+        lines.append('')
+
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
+
+def test_print_typed_properties(capsys):
+    print_typed_properties(
+        [
+            ('b', 'x', 'string', None),
+            ('a', 'y', 'number', None),
+            ('b', 'z', 'boolean', None),
+            ('b', 'a b', 'any', None),
+            ('b', '\u00e9', 'any', None),
+        ],
+        '  ',
+        True,
+    )
+    assert capsys.readouterr().out == '\n'.join([
+        'export interface a {',
+        '  "y"?: number;',
+        '',
+        '}',
+        '',
+        'export interface b {',
+        '  "x"?: string;',
+        '',
+        '  "z"?: boolean;',
+        '',
+        '  "a b"?: any;',
+        '',
+        '  "\\u00e9"?: any;',
+        '',
+        '}',
+        '',
+        '',
+    ])
+
+def load_mapping(file):
+    data = file.buffer.read()
+    # orjson is optional but parses large mappings considerably faster.
+    # It is stricter than json, so fall back for input such as NaN or
+    # Infinity. Note that it reads integers wider than 64 bits as floats.
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+def test_load_mapping(monkeypatch):
+    def load(text):
+        return load_mapping(io.TextIOWrapper(io.BytesIO(text.encode())))
+
+    assert load('{"a": {"type": "long"}}') == {'a': {'type': 'long'}}
+
+    mapping = load('{"properties": {"a": {"type": "long", "null_value": NaN}}}')
+    assert mapping['properties']['a']['type'] == 'long'
+    assert math.isnan(mapping['properties']['a']['null_value'])
+
+    monkeypatch.setattr(sys.modules[__name__], 'orjson', None)
+    assert load('{"a": {"type": "long"}}') == {'a': {'type': 'long'}}
+    assert load('{"a": 123456789012345678901234567890}') == {'a': 123456789012345678901234567890}
 
 def parse_intent(indent):
     char_count = int(indent[:-1])
@@ -322,7 +507,7 @@ def command(indent, interface, optional):
     except (TypeError, IndexError, ValueError):
         raise click.BadParameter('Invalid indent. See --help')
     indent = char * char_count
-    mapping = json.load(sys.stdin)
+    mapping = load_mapping(sys.stdin)
     typed_properties = search_typed_properties(interface, mapping)
     print_typed_properties(typed_properties, indent, optional)
 